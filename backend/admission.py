@@ -0,0 +1,266 @@
+"""
+Admission control and load shedding for the API blueprints
+
+Two checks run before a request reaches its view:
+
+1. Token buckets keyed by device (X-Device-Id), user (JWT in the
+   Authorization header) and client IP. Buckets live in a local SQLite file so
+   every worker process on the host shares the same limits. Exhausted buckets
+   get a 429 with Retry-After. If the store stays locked for longer than
+   ADMISSION_STORE_TIMEOUT, the worker falls back to its own in-memory buckets,
+   so a flood is still limited (per process) rather than admitted.
+   A bucket untouched for burst / rate seconds is full again, i.e. the same
+   as no bucket, so idle buckets are pruned every PRUNE_INTERVAL seconds.
+2. Concurrency caps. Each request holds a DB connection for its lifetime, so
+   in-flight requests are capped per worker, with lower priorities shed first:
+   gate scans may use the whole budget, ordinary traffic 75% of it and
+   dashboard/export traffic half. Shed requests get a fast 503 with Retry-After.
+
+Usage, once per blueprint module:
+    install_admission_control(security_bp, priority=PRIORITY_GATE)
+"""
+import os
+import sqlite3
+import threading
+import time
+from flask import request, jsonify, g
+import jwt
+
+from backend.config import ADMISSION_DB, MAX_INFLIGHT_REQUESTS, RATE_LIMITS
+
+PRIORITY_GATE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+# Share of MAX_INFLIGHT_REQUESTS each priority may fill before being shed
+PRIORITY_SHARE = {
+    PRIORITY_GATE: 1.0,
+    PRIORITY_NORMAL: 0.75,
+    PRIORITY_BULK: 0.5,
+}
+
+_inflight_lock = threading.Lock()
+_inflight_total = 0
+_inflight_by_blueprint = {}
+
+_local = threading.local()
+
+# Seconds to wait for the shared store's write lock before falling back
+ADMISSION_STORE_TIMEOUT = 1.0
+
+_fallback_lock = threading.Lock()
+_fallback_buckets = {}
+
+PRUNE_INTERVAL = 60.0
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+_last_fallback_log = 0.0
+_fallback_uses = 0
+
+
+def _store():
+    """Per-thread connection to the shared limiter store"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(ADMISSION_DB) or '.', exist_ok=True)
+        conn = sqlite3.connect(ADMISSION_DB, timeout=ADMISSION_STORE_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+
+def _request_user_id():
+    """User id from a valid bearer token, if any"""
+    auth = request.headers.get('Authorization', '')
+    if not auth.startswith('Bearer '):
+        return None
+    from backend.routes.auth_routes import SECRET_KEY
+    try:
+        claims = jwt.decode(auth[7:], SECRET_KEY, algorithms=['HS256'])
+        return claims.get('user_id')
+    except jwt.PyJWTError:
+        return None
+
+
+def _request_keys():
+    """Rate limit keys that apply to the current request"""
+    keys = []
+    device_id = request.headers.get('X-Device-Id')
+    if device_id:
+        keys.append(('device', device_id))
+    user_id = _request_user_id()
+    if user_id is not None:
+        keys.append(('user', user_id))
+    keys.append(('ip', request.remote_addr or 'unknown'))
+    return keys
+
+
+def _idle_after(kind):
+    """Seconds after which a bucket of this kind has refilled completely"""
+    rate, burst = RATE_LIMITS[kind]
+    return burst / rate
+
+
+def _prune_due(now):
+    """True for one caller per PRUNE_INTERVAL in this process"""
+    global _last_prune
+    with _prune_lock:
+        if now - _last_prune < PRUNE_INTERVAL:
+            return False
+        _last_prune = now
+        return True
+
+
+def _prune_store(conn, now):
+    """Delete shared buckets that have refilled since their last use"""
+    for kind in RATE_LIMITS:
+        # Keys are 'kind:ident'; ';' sorts right after ':', so this is a key range
+        conn.execute(
+            "DELETE FROM buckets WHERE key >= ? AND key < ? AND updated_at < ?",
+            (f"{kind}:", f"{kind};", now - _idle_after(kind))
+        )
+
+
+def _prune_local(now):
+    """Drop refilled in-memory buckets; call with _fallback_lock held"""
+    for key in [k for k, (_, updated_at) in _fallback_buckets.items()
+                if updated_at < now - _idle_after(k.split(':', 1)[0])]:
+        del _fallback_buckets[key]
+
+
+def _log_fallback(error, now):
+    """Report store failures at most once per PRUNE_INTERVAL"""
+    global _last_fallback_log, _fallback_uses
+    with _fallback_lock:
+        _fallback_uses += 1
+        if now - _last_fallback_log < PRUNE_INTERVAL:
+            return
+        uses, _fallback_uses = _fallback_uses, 0
+        _last_fallback_log = now
+    print(f"Admission store unavailable, using local buckets ({uses} requests): {error}")
+
+
+def _debit(buckets, keys, now):
+    """
+    Refill and check the buckets for `keys` against a {key: (tokens, updated_at)}
+    lookup. Returns (retry_after, {key: tokens after the request}); buckets are
+    only debited when retry_after is 0.
+    """
+    levels = {}
+    retry_after = 0.0
+    for kind, ident in keys:
+        rate, burst = RATE_LIMITS[kind]
+        key = f"{kind}:{ident}"
+        state = buckets(key)
+        tokens = burst if state is None else min(burst, state[0] + (now - state[1]) * rate)
+        if tokens < 1:
+            retry_after = max(retry_after, (1 - tokens) / rate)
+        levels[key] = tokens
+    if retry_after == 0:
+        levels = {key: tokens - 1 for key, tokens in levels.items()}
+    return retry_after, levels
+
+
+def _take_local(keys, now):
+    """take_tokens against this process's in-memory buckets"""
+    with _fallback_lock:
+        if _prune_due(now):
+            _prune_local(now)
+        retry_after, levels = _debit(_fallback_buckets.get, keys, now)
+        if retry_after == 0:
+            _fallback_buckets.update((key, (tokens, now)) for key, tokens in levels.items())
+        return retry_after
+
+
+def take_tokens(keys, now=None):
+    """
+    Take one token from every bucket in `keys` ([(kind, id)]).
+
+    All buckets are checked in a single transaction and only debited if all of
+    them have a token. Returns 0 when admitted, otherwise the number of seconds
+    until the emptiest bucket refills. Uses per-process buckets if the shared
+    store is unavailable.
+    """
+    now = now if now is not None else time.time()
+    try:
+        conn = _store()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            lookup = lambda key: conn.execute(
+                "SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            retry_after, levels = _debit(lookup, keys, now)
+
+            if retry_after == 0:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(key, tokens, now) for key, tokens in levels.items()]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if _prune_due(now):
+            try:
+                _prune_store(conn, now)
+            except sqlite3.Error as e:
+                print(f"Admission store prune failed: {e}")
+        return retry_after
+    except sqlite3.Error as e:
+        _log_fallback(e, now)
+        return _take_local(keys, now)
+
+
+def _try_acquire(blueprint, priority, max_concurrent):
+    global _inflight_total
+    limit = MAX_INFLIGHT_REQUESTS * PRIORITY_SHARE[priority]
+    with _inflight_lock:
+        in_blueprint = _inflight_by_blueprint.get(blueprint, 0)
+        if _inflight_total >= limit:
+            return False
+        if max_concurrent is not None and in_blueprint >= max_concurrent:
+            return False
+        _inflight_total += 1
+        _inflight_by_blueprint[blueprint] = in_blueprint + 1
+        return True
+
+
+def _release(blueprint):
+    global _inflight_total
+    with _inflight_lock:
+        _inflight_total -= 1
+        _inflight_by_blueprint[blueprint] -= 1
+
+
+def _reject(status, message, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+def install_admission_control(bp, priority=PRIORITY_NORMAL, max_concurrent=None):
+    """Register rate limiting and load shedding hooks on a blueprint"""
+
+    @bp.before_request
+    def _admit():
+        retry_after = take_tokens(_request_keys())
+        if retry_after:
+            return _reject(429, "Too many requests", retry_after)
+
+        if not _try_acquire(bp.name, priority, max_concurrent):
+            return _reject(503, "Server busy, try again shortly", 1)
+        g._admission_slot = bp.name
+
+    @bp.teardown_request
+    def _leave(exc):
+        if g.pop('_admission_slot', None) == bp.name:
+            _release(bp.name)
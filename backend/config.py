@@ -1,6 +1,10 @@
 import os
+import json
+import time
 import pymysql
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from backend.db.query_log import TimedDictCursor, record_timing, current_endpoint, attributed_to, add_request_db_time
 
 load_dotenv()
 
@@ -10,14 +14,92 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'admin'),
     'database': os.getenv('DB_NAME', 'smart_gate_pass'),
     'charset': 'utf8mb4',
-    'cursorclass': pymysql.cursors.DictCursor,
+    'cursorclass': TimedDictCursor,
     'autocommit': False
 }
 
-def get_db_connection():
-    """Get a new database connection"""
+# Shard router. With DB_SHARDS unset everything lives in the single DB_CONFIG
+# database. To split by campus or department, e.g. for several local instances:
+#   DB_SHARDS='{"north": {"port": 3307}, "south": {"port": 3308}}'
+#   SHARD_MAP='{"CSE": "north", "Mechanical": "south"}'
+# Each shard entry overrides DB_CONFIG fields. Requests pick a shard with the
+# X-Campus / X-Department header or the campus / department query argument;
+# shard names are accepted as campus keys directly. Once sharded, pass ids are
+# only unique within a shard, so any request that reads or writes specific rows
+# must name its campus; only list/stats endpoints fan out over all shards.
+DB_SHARDS = {
+    name: {**DB_CONFIG, **overrides}
+    for name, overrides in json.loads(os.getenv('DB_SHARDS', '{}')).items()
+}
+SHARD_MAP = json.loads(os.getenv('SHARD_MAP', '{}'))
+DEFAULT_SHARD = os.getenv('DEFAULT_SHARD', next(iter(DB_SHARDS), 'default'))
+if not DB_SHARDS:
+    DB_SHARDS = {DEFAULT_SHARD: DB_CONFIG}
+if DEFAULT_SHARD not in DB_SHARDS:
+    raise ValueError(f"DEFAULT_SHARD '{DEFAULT_SHARD}' is not one of DB_SHARDS: {', '.join(DB_SHARDS)}")
+if any(shard not in DB_SHARDS for shard in SHARD_MAP.values()):
+    raise ValueError("SHARD_MAP points at a shard missing from DB_SHARDS")
+
+# Passes whose window ended more than this many days ago are moved out of the
+# hot tables into compressed monthly archive files (see scripts/archive_passes.py)
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join('data', 'archive'))
+ARCHIVE_HORIZON_DAYS = int(os.getenv('ARCHIVE_HORIZON_DAYS', '180'))
+
+# Admission control (see backend/admission.py). Every request opens its own DB
+# connection, so MAX_INFLIGHT_REQUESTS is effectively the per-worker DB budget.
+ADMISSION_DB = os.getenv('ADMISSION_DB', os.path.join('data', 'admission.sqlite3'))
+MAX_INFLIGHT_REQUESTS = int(os.getenv('MAX_INFLIGHT_REQUESTS', '32'))
+RATE_LIMITS = {
+    # kind: (tokens per second, burst)
+    'device': (float(os.getenv('RATE_LIMIT_DEVICE_RPS', '2')), int(os.getenv('RATE_LIMIT_DEVICE_BURST', '10'))),
+    'user': (float(os.getenv('RATE_LIMIT_USER_RPS', '5')), int(os.getenv('RATE_LIMIT_USER_BURST', '20'))),
+    'ip': (float(os.getenv('RATE_LIMIT_IP_RPS', '20')), int(os.getenv('RATE_LIMIT_IP_BURST', '60'))),
+}
+
+# Write-behind pass intake (see backend/intake_queue.py). The drainer writes at
+# most INTAKE_BATCH_SIZE passes per shard every INTAKE_DRAIN_INTERVAL seconds.
+INTAKE_DB = os.getenv('INTAKE_DB', os.path.join('data', 'intake.sqlite3'))
+INTAKE_BATCH_SIZE = int(os.getenv('INTAKE_BATCH_SIZE', '200'))
+INTAKE_DRAIN_INTERVAL = float(os.getenv('INTAKE_DRAIN_INTERVAL', '0.5'))
+INTAKE_MAX_ATTEMPTS = int(os.getenv('INTAKE_MAX_ATTEMPTS', '10'))
+
+class ShardKeyError(ValueError):
+    """Request names an unknown campus, or none where one is required (HTTP 400)"""
+
+def is_sharded():
+    """True when more than one database is configured"""
+    return len(DB_SHARDS) > 1
+
+def shard_for(key):
+    """Resolve a campus or department to a shard name"""
+    if key is None:
+        if is_sharded():
+            raise ShardKeyError("Campus or department required (X-Campus / X-Department header)")
+        return DEFAULT_SHARD
+    if key in DB_SHARDS:
+        return key
+    if key in SHARD_MAP:
+        return SHARD_MAP[key]
+    raise ShardKeyError(f"Unknown campus or department: {key}")
+
+def request_shard_key():
+    """Campus or department named by the current request, if any"""
+    from flask import has_request_context, request
+    if not has_request_context():
+        return None
+    return (request.headers.get('X-Campus') or request.args.get('campus') or
+            request.headers.get('X-Department') or request.args.get('department'))
+
+def get_db_connection(shard=None):
+    """Get a new database connection to `shard`, or the current request's shard"""
     try:
-        conn = pymysql.connect(**DB_CONFIG)
+        if shard is None:
+            shard = shard_for(request_shard_key())
+        start = time.perf_counter()
+        try:
+            conn = pymysql.connect(**DB_SHARDS[shard])
+        finally:
+            record_timing(f"CONNECT {shard}", (time.perf_counter() - start) * 1000)
         return conn
     except pymysql.Error as e:
         print(f"Database connection error: {e}")
@@ -30,3 +112,37 @@ def close_db_connection(conn):
             conn.close()
     except Exception as e:
         print(f"Error closing connection: {e}")
+
+def scatter_gather(fn):
+    """
+    Run fn(cursor) against every shard in parallel.
+
+    Returns {shard name: result}. Each shard gets its own connection, which is
+    closed afterwards; any shard failure is raised to the caller. DB time and
+    slow queries on the workers are attributed to the calling request.
+    """
+    endpoint = current_endpoint()
+
+    def query(shard):
+        conn = get_db_connection(shard)
+        cursor = conn.cursor()
+        try:
+            return fn(cursor)
+        finally:
+            cursor.close()
+            close_db_connection(conn)
+
+    def run(shard):
+        return attributed_to(endpoint, query, shard)
+
+    with ThreadPoolExecutor(max_workers=len(DB_SHARDS)) as pool:
+        futures = {shard: pool.submit(run, shard) for shard in DB_SHARDS}
+        results = {}
+        for shard, future in futures.items():
+            results[shard], db_ms = future.result()
+            add_request_db_time(db_ms)
+        return results
+
+def should_scatter():
+    """True when a request spans all shards (sharded and no shard named)"""
+    return is_sharded() and request_shard_key() is None
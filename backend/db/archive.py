@@ -0,0 +1,240 @@
+"""
+Cold archival of gate pass data
+
+Expired passes (and their qr_codes rows) are exported to gzip-compressed CSV
+files grouped by month and then removed from the hot tables, so listings and
+aggregates only scan current data. Archived months are read back on demand.
+
+Attendance rows stay hot, but deleting a pass sets their pass_id to NULL, so
+the rows that reference an archived pass are copied into the archive first
+with pass_id intact.
+
+Layout on disk:
+    <ARCHIVE_DIR>/<table>/<YYYY-MM>/<run stamp>.csv.gz
+"""
+import csv
+import glob
+import gzip
+import os
+from datetime import datetime
+
+from backend.config import ARCHIVE_DIR, is_sharded
+
+PASSES_TABLE = 'gate_pass_requests'
+QR_TABLE = 'qr_codes'
+ATTENDANCE_TABLE = 'attendance'
+
+# Sargable form of COALESCE(to_time, from_time) < cutoff, so the
+# (to_time, from_time) index is used and only expired rows are locked
+_EXPIRED_FILTER = "(to_time < %s OR (to_time IS NULL AND from_time < %s))"
+WINDOW_INDEX = 'idx_gate_pass_window'
+
+
+def ensure_window_index(cursor):
+    """
+    Add the (to_time, from_time) index to tables created before it existed.
+    Without it every archive batch is a full scan that locks each row it reads.
+    """
+    cursor.execute("""
+        SELECT COUNT(*) AS n FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (PASSES_TABLE, WINDOW_INDEX))
+    if not cursor.fetchone()['n']:
+        print(f"Adding {WINDOW_INDEX} to {PASSES_TABLE}...")
+        cursor.execute(f"ALTER TABLE {PASSES_TABLE} ADD INDEX {WINDOW_INDEX} (to_time, from_time)")
+
+
+def archive_dir_for(shard, archive_dir=ARCHIVE_DIR):
+    """Archive directory of a shard; unsharded setups use archive_dir itself"""
+    return os.path.join(archive_dir, shard) if is_sharded() else archive_dir
+
+
+def _month_of(row):
+    """Month bucket (YYYY-MM) a pass row is archived under"""
+    when = row.get('from_time') or row.get('to_time') or row.get('created_at')
+    return when.strftime('%Y-%m') if when else 'undated'
+
+
+def _to_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+def _write_csv(path, columns, rows):
+    """Write rows to a new gzip CSV file and flush it to disk"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as raw:
+        with gzip.open(raw, 'wt', newline='', encoding='utf-8') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([_to_cell(row.get(c)) for c in columns])
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SHOW TABLES LIKE %s", (table,))
+    return cursor.fetchone() is not None
+
+
+def archive_passes(conn, cutoff, archive_dir=ARCHIVE_DIR, batch_size=1000, dry_run=False):
+    """
+    Move passes whose window ended before `cutoff` into archive files.
+
+    Each batch is locked, written and fsynced to disk before it is deleted and
+    committed, so a crash can at worst leave a batch both archived and still
+    hot; readers de-duplicate by id, and the next run archives it again.
+    Returns the number of passes archived.
+    """
+    cursor = conn.cursor()
+    run_stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+    archived = 0
+    batch_no = 0
+
+    try:
+        ensure_window_index(cursor)
+
+        if dry_run:
+            cursor.execute(f"""
+                SELECT COUNT(*) AS n FROM {PASSES_TABLE}
+                WHERE {_EXPIRED_FILTER}
+            """, (cutoff, cutoff))
+            return cursor.fetchone()['n']
+
+        has_qr_table = _table_exists(cursor, QR_TABLE)
+        has_attendance_table = _table_exists(cursor, ATTENDANCE_TABLE)
+
+        while True:
+            cursor.execute(f"""
+                SELECT * FROM {PASSES_TABLE}
+                WHERE {_EXPIRED_FILTER}
+                ORDER BY to_time, from_time, id
+                LIMIT %s
+                FOR UPDATE
+            """, (cutoff, cutoff, batch_size))
+            rows = cursor.fetchall()
+
+            if not rows:
+                # Release the locks taken by the empty final scan
+                conn.rollback()
+                break
+
+            pass_columns = [d[0] for d in cursor.description]
+            ids = [r['id'] for r in rows]
+
+            qr_rows, qr_columns = [], []
+            if has_qr_table:
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(
+                    f"SELECT * FROM {QR_TABLE} WHERE request_id IN ({placeholders})",
+                    ids
+                )
+                qr_rows = cursor.fetchall()
+                qr_columns = [d[0] for d in cursor.description]
+
+            attendance_rows, attendance_columns = [], []
+            if has_attendance_table:
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(
+                    f"SELECT * FROM {ATTENDANCE_TABLE} WHERE pass_id IN ({placeholders}) FOR UPDATE",
+                    ids
+                )
+                attendance_rows = cursor.fetchall()
+                attendance_columns = [d[0] for d in cursor.description]
+
+            months = {}
+            for r in rows:
+                months.setdefault(_month_of(r), []).append(r)
+            month_by_id = {r['id']: m for m, rs in months.items() for r in rs}
+
+            qr_months = {}
+            for q in qr_rows:
+                qr_months.setdefault(month_by_id[q['request_id']], []).append(q)
+
+            attendance_months = {}
+            for a in attendance_rows:
+                attendance_months.setdefault(month_by_id[a['pass_id']], []).append(a)
+
+            filename = f"{run_stamp}-{batch_no:05d}.csv.gz"
+            for month, month_rows in months.items():
+                _write_csv(os.path.join(archive_dir, PASSES_TABLE, month, filename),
+                           pass_columns, month_rows)
+            for month, month_rows in qr_months.items():
+                _write_csv(os.path.join(archive_dir, QR_TABLE, month, filename),
+                           qr_columns, month_rows)
+            for month, month_rows in attendance_months.items():
+                _write_csv(os.path.join(archive_dir, ATTENDANCE_TABLE, month, filename),
+                           attendance_columns, month_rows)
+
+            placeholders = ', '.join(['%s'] * len(ids))
+            if has_qr_table:
+                cursor.execute(
+                    f"DELETE FROM {QR_TABLE} WHERE request_id IN ({placeholders})", ids
+                )
+            cursor.execute(
+                f"DELETE FROM {PASSES_TABLE} WHERE id IN ({placeholders})", ids
+            )
+            conn.commit()
+
+            archived += len(rows)
+            batch_no += 1
+            print(f"Archived {archived} passes so far")
+
+        return archived
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def archived_months(table=PASSES_TABLE, archive_dir=ARCHIVE_DIR):
+    """List the months available in the archive, oldest first"""
+    base = os.path.join(archive_dir, table)
+    if not os.path.isdir(base):
+        return []
+    return sorted(
+        m for m in os.listdir(base)
+        if os.path.isdir(os.path.join(base, m))
+    )
+
+
+def query_archive(table=PASSES_TABLE, from_month=None, to_month=None,
+                  filters=None, limit=None, archive_dir=ARCHIVE_DIR):
+    """
+    Read archived rows for the given month range (inclusive, YYYY-MM).
+
+    `filters` maps column names to the values they must equal. Only the files
+    for the requested months are opened; values come back as strings with
+    empty cells mapped to None.
+    """
+    filters = {k: str(v) for k, v in (filters or {}).items()}
+    seen_ids = set()
+    result = []
+
+    for month in archived_months(table, archive_dir):
+        if from_month and month < from_month:
+            continue
+        if to_month and month > to_month:
+            continue
+
+        pattern = os.path.join(archive_dir, table, month, '*.csv.gz')
+        for path in sorted(glob.glob(pattern)):
+            with gzip.open(path, 'rt', newline='', encoding='utf-8') as fh:
+                for row in csv.DictReader(fh):
+                    if any(row.get(k) != v for k, v in filters.items()):
+                        continue
+                    if row['id'] in seen_ids:
+                        continue
+                    seen_ids.add(row['id'])
+                    result.append({k: (v if v != '' else None) for k, v in row.items()})
+                    if limit and len(result) >= limit:
+                        return result
+
+    return result
@@ -0,0 +1,60 @@
+"""
+Pass change log
+
+Every status change or QR (re)issue appends a row to pass_events. The
+auto-increment seq is the version number gate scanners sync against.
+
+The table is created by scripts/init_db.py. Writers that may run against an
+older database call ensure_events_table() before their transaction starts:
+CREATE TABLE commits implicitly in MySQL, even when the table exists.
+"""
+
+EVENT_CREATED = 'created'
+EVENT_APPROVED = 'approved'
+EVENT_REJECTED = 'rejected'
+EVENT_PENDING = 'pending'
+EVENT_REISSUED = 'reissued'
+
+STATUS_EVENTS = {
+    'Approved': EVENT_APPROVED,
+    'Rejected': EVENT_REJECTED,
+    'Pending': EVENT_PENDING,
+}
+
+_tables_ready = set()
+
+
+def ensure_events_table(cursor):
+    """Create pass_events once per database (shard) per process"""
+    conn = cursor.connection
+    key = (conn.host, conn.port, conn.db)
+    if key in _tables_ready:
+        return
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pass_events (
+            seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+            request_id INT NOT NULL,
+            event VARCHAR(16) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_pass_events_request (request_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    _tables_ready.add(key)
+
+
+def record_pass_event(cursor, request_id, event):
+    """Append an event for a pass; committed with the caller's transaction"""
+    cursor.execute(
+        "INSERT INTO pass_events (request_id, event) VALUES (%s, %s)",
+        (request_id, event)
+    )
+
+
+def record_pass_events(cursor, request_ids, event):
+    """Append the same event for many passes in one round trip"""
+    if not request_ids:
+        return
+    cursor.executemany(
+        "INSERT INTO pass_events (request_id, event) VALUES (%s, %s)",
+        [(request_id, event) for request_id in request_ids]
+    )
@@ -0,0 +1,94 @@
+"""
+Statement timing and slow-query capture
+
+TimedDictCursor is the cursor class for every connection (see DB_CONFIG).
+It times each execute call, adds the time to the current request's DB total
+and keeps statements slower than SLOW_QUERY_MS in a bounded ring buffer.
+
+Worker threads have no request context; code that queries on behalf of a
+request from other threads (scatter_gather) wraps the work in
+attributed_to(endpoint) and adds the returned time with add_request_db_time().
+"""
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import pymysql
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_BUFFER = int(os.getenv('SLOW_QUERY_BUFFER', '200'))
+
+_slow_queries = deque(maxlen=SLOW_QUERY_BUFFER)
+_slow_lock = threading.Lock()
+
+_worker = threading.local()
+
+
+def current_endpoint():
+    """Endpoint the current thread's queries belong to, if any"""
+    attributed = getattr(_worker, 'attributed', None)
+    if attributed is not None:
+        return attributed['endpoint']
+    from flask import has_request_context, request
+    return request.endpoint if has_request_context() else None
+
+
+def add_request_db_time(elapsed_ms):
+    """Add DB time to the current request's total, if in a request"""
+    from flask import has_request_context, g
+    if has_request_context():
+        g._db_ms = g.get('_db_ms', 0.0) + elapsed_ms
+
+
+def attributed_to(endpoint, fn, *args):
+    """
+    Run fn(*args) on this thread with its queries attributed to `endpoint`.
+    Returns (result, DB time in ms).
+    """
+    _worker.attributed = {'endpoint': endpoint, 'db_ms': 0.0}
+    try:
+        result = fn(*args)
+        return result, _worker.attributed['db_ms']
+    finally:
+        _worker.attributed = None
+
+
+def record_timing(statement, elapsed_ms, rows=None):
+    """Add a timing to the request total and capture it if slow"""
+    endpoint = current_endpoint()
+    attributed = getattr(_worker, 'attributed', None)
+    if attributed is not None:
+        attributed['db_ms'] += elapsed_ms
+    else:
+        add_request_db_time(elapsed_ms)
+
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    entry = {
+        'at': datetime.now().isoformat(timespec='milliseconds'),
+        'duration_ms': round(elapsed_ms, 2),
+        'endpoint': endpoint,
+        'rows': rows,
+        'statement': ' '.join(statement.split())[:1000],
+    }
+    with _slow_lock:
+        _slow_queries.append(entry)
+
+
+def slow_queries():
+    """Captured slow statements, newest first"""
+    with _slow_lock:
+        return list(reversed(_slow_queries))
+
+
+class TimedDictCursor(pymysql.cursors.DictCursor):
+    """DictCursor that times every statement"""
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            record_timing(query, elapsed_ms, self.rowcount)
@@ -0,0 +1,189 @@
+"""
+Compact storage format for face embeddings
+
+students.face_embedding blobs are L2-normalised vectors stored as
+
+    header '<2sBBH'  magic b'FE', format version, dtype code, dimension
+    int8:    float32 scale, then int8[dim]  (value = code * scale)
+    float16: float16[dim]
+
+Blobs without a valid header are legacy raw float32 vectors (format version 0)
+and are still decoded; scripts/migrate_embeddings.py re-encodes them.
+
+float16 is the default storage type. int8 blobs are smaller but lose the
+precision the final re-rank needs.
+
+FaceGallery keeps only an int8 matrix with per-row scales resident (about a
+quarter of float32) and scans it per query. The few best candidates are then
+re-ranked on their stored float blobs, fetched through a loader callback.
+"""
+import struct
+import numpy as np
+
+MAGIC = b'FE'
+FORMAT_VERSION = 1
+
+DTYPE_FLOAT16 = 1
+DTYPE_INT8 = 2
+DTYPE_CODES = {'float16': DTYPE_FLOAT16, 'int8': DTYPE_INT8}
+
+HEADER = struct.Struct('<2sBBH')
+SCALE = struct.Struct('<f')
+
+# Rows scored per step when scanning the gallery, bounding temporaries
+SCAN_CHUNK = 8192
+
+
+def normalize(vec):
+    """L2-normalise to float32"""
+    vec = np.asarray(vec, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+def quantize_int8(vec):
+    """Symmetric per-vector int8 quantisation; returns (codes, scale)"""
+    peak = float(np.max(np.abs(vec))) if vec.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    codes = np.clip(np.rint(vec / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def encode_embedding(vec, dtype='float16'):
+    """Encode an embedding as a versioned blob"""
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    vec = normalize(vec)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype], vec.size)
+
+    if dtype == 'int8':
+        codes, scale = quantize_int8(vec)
+        return header + SCALE.pack(scale) + codes.tobytes()
+    return header + vec.astype(np.float16).tobytes()
+
+
+def _versioned_length(dtype_code, dim):
+    if dtype_code == DTYPE_INT8:
+        return HEADER.size + SCALE.size + dim
+    if dtype_code == DTYPE_FLOAT16:
+        return HEADER.size + 2 * dim
+    return None
+
+
+def blob_version(blob):
+    """
+    Format version of a stored blob (0 for legacy float32). A blob only counts
+    as versioned if its length matches its header, so a float32 vector that
+    happens to start with b'FE' is still read as legacy.
+    """
+    if len(blob) >= HEADER.size and blob[:2] == MAGIC:
+        _, version, dtype_code, dim = HEADER.unpack_from(blob)
+        if len(blob) == _versioned_length(dtype_code, dim):
+            return version
+    return 0
+
+
+def _decode_parts(blob):
+    """(int8 codes, scale) or (float vector, None) without converting"""
+    blob = bytes(blob)
+    version = blob_version(blob)
+
+    if version == 0:
+        if len(blob) % 4:
+            raise ValueError("Not a float32 embedding blob")
+        return normalize(np.frombuffer(blob, dtype=np.float32)), None
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version {version}")
+
+    _, _, dtype_code, dim = HEADER.unpack_from(blob)
+    body = blob[HEADER.size:]
+    if dtype_code == DTYPE_INT8:
+        (scale,) = SCALE.unpack_from(body)
+        return np.frombuffer(body, dtype=np.int8, count=dim, offset=SCALE.size), scale
+    if dtype_code == DTYPE_FLOAT16:
+        return np.frombuffer(body, dtype=np.float16, count=dim).astype(np.float32), None
+    raise ValueError(f"Unknown embedding dtype code {dtype_code}")
+
+
+def decode_embedding(blob):
+    """Decode any stored blob to a float32 vector"""
+    values, scale = _decode_parts(blob)
+    if scale is not None:
+        return values.astype(np.float32) * scale
+    return values
+
+
+class FaceGallery:
+    """
+    In-memory int8 gallery of student embeddings.
+
+    load_blobs(student_ids) returns the stored blobs of those students (e.g.
+    SELECT id, face_embedding FROM students WHERE id IN (...)) as a
+    {student_id: blob} dict; it is only called for re-rank candidates. Without
+    it, candidates are re-ranked on their dequantised codes (approximate).
+    """
+
+    def __init__(self, ids, codes, scales, load_blobs=None):
+        self.ids = np.asarray(ids)
+        self.codes = np.ascontiguousarray(codes, dtype=np.int8)
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.load_blobs = load_blobs
+
+    @classmethod
+    def from_blobs(cls, rows, load_blobs=None):
+        """Build from (student_id, blob) pairs; int8 blobs are used as stored"""
+        ids, codes, scales = [], [], []
+        for student_id, blob in rows:
+            values, scale = _decode_parts(blob)
+            if scale is None:
+                values, scale = quantize_int8(values)
+            ids.append(student_id)
+            codes.append(values)
+            scales.append(scale)
+        dim = len(codes[0]) if codes else 0
+        return cls(ids, np.array(codes, dtype=np.int8).reshape(len(codes), dim), scales, load_blobs)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes + self.ids.nbytes
+
+    def _candidate_vectors(self, rows):
+        """Float vectors of gallery rows, from their stored blobs when possible"""
+        vectors = self.codes[rows].astype(np.float32) * self.scales[rows, None]
+        if self.load_blobs is None:
+            return vectors
+        blobs = self.load_blobs([self.ids[r].item() for r in rows])
+        for i, r in enumerate(rows):
+            blob = blobs.get(self.ids[r].item())
+            if blob is not None:
+                vectors[i] = decode_embedding(blob)
+        return vectors
+
+    def coarse_scores(self, query):
+        """Approximate cosine scores of every gallery row, computed on int8 codes"""
+        q_codes, q_scale = quantize_int8(normalize(query))
+        q = q_codes.astype(np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        # int8 x int8 dot products are exact in float32 for dim <= 1024
+        for start in range(0, len(self.codes), SCAN_CHUNK):
+            chunk = self.codes[start:start + SCAN_CHUNK]
+            scores[start:start + len(chunk)] = chunk.astype(np.float32) @ q
+        return scores * self.scales * q_scale
+
+    def match(self, query, top_k=1, candidates=32):
+        """
+        Best matches for a query as [(student_id, cosine similarity)].
+
+        The top `candidates` rows by coarse score are re-ranked against the
+        float query using their stored vectors (see load_blobs).
+        """
+        if not len(self.codes):
+            return []
+        query = normalize(query)
+        coarse = self.coarse_scores(query)
+
+        n = min(candidates, len(coarse))
+        top = np.argpartition(-coarse, n - 1)[:n]
+        exact = self._candidate_vectors(top) @ query
+        order = np.argsort(-exact)[:top_k]
+        return [(self.ids[top[i]].item(), float(exact[i])) for i in order]
@@ -0,0 +1,174 @@
+"""
+Bounded image ingest for face verification uploads
+
+Uploads are read into a per-thread buffer that is reused across requests and
+capped at MAX_FACE_UPLOAD_BYTES. The image header is checked against
+MAX_FACE_PIXELS before any pixel data is decoded. JPEGs are decoded directly
+at reduced scale (libjpeg DCT scaling via Image.draft), so a 12 MP phone photo
+never materialises at full size. The result is cropped to the largest
+detected face (OpenCV Haar cascade when available, centre crop otherwise) and
+resized to the embedding input size.
+"""
+import io
+import os
+import threading
+from PIL import Image, ImageOps
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+MAX_FACE_UPLOAD_BYTES = int(os.getenv('MAX_FACE_UPLOAD_BYTES', str(5 * 1024 * 1024)))
+MAX_FACE_PIXELS = int(os.getenv('MAX_FACE_PIXELS', str(24 * 1000 * 1000)))
+FACE_DECODE_SIZE = 640
+FACE_CROP_SIZE = 160
+FACE_CROP_MARGIN = 0.25
+
+_CHUNK = 64 * 1024
+
+_local = threading.local()
+_cascade = None
+
+
+class IngestError(Exception):
+    """Upload rejected; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only view over a slice of the reusable upload buffer"""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def _upload_buffer():
+    buf = getattr(_local, 'buffer', None)
+    if buf is None:
+        buf = _local.buffer = bytearray(MAX_FACE_UPLOAD_BYTES + 1)
+    return buf
+
+
+def read_upload(file_storage):
+    """Read an uploaded file into the thread's buffer, enforcing the byte limit"""
+    buf = _upload_buffer()
+    view = memoryview(buf)
+    stream = file_storage.stream
+    total = 0
+
+    while total < len(buf):
+        chunk = view[total:total + _CHUNK]
+        if hasattr(stream, 'readinto'):
+            n = stream.readinto(chunk)
+        else:
+            data = stream.read(len(chunk))
+            n = len(data)
+            chunk[:n] = data
+        if not n:
+            break
+        total += n
+
+    if total > MAX_FACE_UPLOAD_BYTES:
+        raise IngestError(f"Image larger than {MAX_FACE_UPLOAD_BYTES} bytes", 413)
+    if total == 0:
+        raise IngestError("Empty image")
+    return view[:total]
+
+
+def decode_reduced(data, target=FACE_DECODE_SIZE):
+    """Decode image bytes to RGB with the longest side close to `target`"""
+    try:
+        img = Image.open(_BufferReader(data))
+    except Exception:
+        raise IngestError("Unsupported or corrupt image")
+
+    width, height = img.size
+    if width * height > MAX_FACE_PIXELS:
+        raise IngestError(f"Image larger than {MAX_FACE_PIXELS} pixels", 413)
+
+    if img.format == 'JPEG':
+        img.draft('RGB', (target, target))
+
+    try:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGB')
+    except Exception:
+        raise IngestError("Unsupported or corrupt image")
+
+    if max(img.size) > target:
+        img.thumbnail((target, target), Image.BILINEAR)
+    return img
+
+
+def _detect_face(img):
+    """Largest face box (x, y, w, h), or None"""
+    global _cascade
+    if cv2 is None:
+        return None
+    if _cascade is None:
+        _cascade = cv2.CascadeClassifier(
+            os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        )
+    gray = np.asarray(img.convert('L'))
+    faces = _cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40))
+    if len(faces) == 0:
+        return None
+    return max(faces, key=lambda f: f[2] * f[3])
+
+
+def crop_face(img, size=FACE_CROP_SIZE):
+    """Square crop around the detected face; returns (image, face_detected)"""
+    box = _detect_face(img)
+    width, height = img.size
+
+    if box is None:
+        side = min(width, height)
+        cx, cy = width / 2, height / 2
+    else:
+        x, y, w, h = (int(v) for v in box)
+        side = max(w, h) * (1 + 2 * FACE_CROP_MARGIN)
+        cx, cy = x + w / 2, y + h / 2
+
+    half = side / 2
+    left = int(max(0, cx - half))
+    top = int(max(0, cy - half))
+    right = int(min(width, cx + half))
+    bottom = int(min(height, cy + half))
+
+    face = img.resize((size, size), Image.BILINEAR, box=(left, top, right, bottom))
+    return face, box is not None
+
+
+def ingest_face_image(file_storage):
+    """Upload -> bounded decode -> face crop ready for embedding"""
+    img = decode_reduced(read_upload(file_storage))
+    return crop_face(img)
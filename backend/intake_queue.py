@@ -0,0 +1,317 @@
+"""
+Durable write-behind intake for pass requests
+
+During rush hours POST /passes/queued only appends the request to a local
+SQLite queue (WAL, synchronous=FULL, so an acknowledged request survives a
+crash) and answers with a provisional id. A drainer writes queued passes to
+MySQL in batches of INTAKE_BATCH_SIZE per shard every INTAKE_DRAIN_INTERVAL
+seconds, which turns bursts into a steady write rate.
+
+Exactly-once: each queued pass carries its provisional id into the unique
+gate_pass_requests.intake_id column. If a drainer dies after the MySQL commit
+but before marking the entry done, the entry's lease expires and the next
+drain finds the existing pass by intake_id instead of inserting it again.
+Rows MySQL rejects (e.g. an unknown student) fail on their own; failed
+batches (connection loss, deadlocks) are retried with exponential backoff.
+An entry is only marked done after its QR image has been rendered; a render
+failure is kept in qr_error.
+
+Run the drainer with scripts/drain_intake.py (or start_drainer() in-process).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import pymysql
+
+from backend.config import (
+    get_db_connection, close_db_connection, DB_SHARDS,
+    INTAKE_DB, INTAKE_BATCH_SIZE, INTAKE_DRAIN_INTERVAL, INTAKE_MAX_ATTEMPTS
+)
+from backend.db.pass_events import ensure_events_table, record_pass_events, EVENT_CREATED
+from backend.qr_images import render_qr_batch
+
+STATUS_QUEUED = 'queued'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+LEASE_SECONDS = 60
+MAX_BACKOFF_SECONDS = 60
+DONE_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Errors that say nothing about the rows themselves; the batch is retried
+_CONNECTION_ERRORS = (pymysql.OperationalError, pymysql.InterfaceError)
+
+_local = threading.local()
+_intake_column_ready = set()
+_drainer = None
+
+
+def _store():
+    """Per-thread connection to the intake queue"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(INTAKE_DB) or '.', exist_ok=True)
+        conn = sqlite3.connect(INTAKE_DB, timeout=5, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS intake (
+                id TEXT PRIMARY KEY,
+                shard TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                pass_id INTEGER,
+                qr_error TEXT,
+                created_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                lease_until REAL NOT NULL DEFAULT 0
+            )
+        """)
+        columns = {r['name'] for r in conn.execute("PRAGMA table_info(intake)")}
+        if 'qr_error' not in columns:
+            conn.execute("ALTER TABLE intake ADD COLUMN qr_error TEXT")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_intake_ready
+            ON intake (status, shard, next_attempt_at)
+        """)
+        _local.conn = conn
+    return conn
+
+
+def enqueue_pass(shard, reason, from_time, to_time, status, student_id):
+    """Durably queue a pass for creation; returns its provisional id"""
+    provisional_id = str(uuid.uuid4())
+    payload = json.dumps({
+        'reason': reason,
+        'from_time': from_time,
+        'to_time': to_time,
+        'status': status,
+        'student_id': student_id,
+        'qr_token': str(uuid.uuid4()),
+    })
+    now = time.time()
+    _store().execute(
+        "INSERT INTO intake (id, shard, payload, status, created_at, next_attempt_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (provisional_id, shard, payload, STATUS_QUEUED, now, now)
+    )
+    return provisional_id
+
+
+def get_intake(provisional_id):
+    """Queue entry for a provisional id as a dict, or None"""
+    row = _store().execute(
+        "SELECT id, status, attempts, last_error, pass_id, qr_error, payload FROM intake WHERE id = ?",
+        (provisional_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    entry = dict(row)
+    entry['qr_token'] = json.loads(entry.pop('payload'))['qr_token']
+    return entry
+
+
+def _claim(shard, limit, now):
+    """Lease up to `limit` ready entries of a shard to this drainer"""
+    store = _store()
+    store.execute("BEGIN IMMEDIATE")
+    try:
+        rows = store.execute("""
+            SELECT id, payload, attempts FROM intake
+            WHERE status = ? AND shard = ? AND next_attempt_at <= ? AND lease_until < ?
+            ORDER BY created_at
+            LIMIT ?
+        """, (STATUS_QUEUED, shard, now, now, limit)).fetchall()
+        store.executemany(
+            "UPDATE intake SET lease_until = ? WHERE id = ?",
+            [(now + LEASE_SECONDS, r['id']) for r in rows]
+        )
+        store.execute("COMMIT")
+        return rows
+    except Exception:
+        store.execute("ROLLBACK")
+        raise
+
+
+def _ensure_intake_column(cursor, shard):
+    """Add gate_pass_requests.intake_id on databases created before it existed"""
+    if shard in _intake_column_ready:
+        return
+    cursor.execute("""
+        SELECT COUNT(*) AS n FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'gate_pass_requests' AND COLUMN_NAME = 'intake_id'
+    """)
+    if not cursor.fetchone()['n']:
+        cursor.execute(
+            "ALTER TABLE gate_pass_requests ADD COLUMN intake_id VARCHAR(36) NULL UNIQUE"
+        )
+    _intake_column_ready.add(shard)
+
+
+def _schedule_retry(rows, error, now):
+    store = _store()
+    updates = []
+    for r in rows:
+        attempts = r['attempts'] + 1
+        status = STATUS_FAILED if attempts >= INTAKE_MAX_ATTEMPTS else STATUS_QUEUED
+        backoff = min(MAX_BACKOFF_SECONDS, 2 ** attempts)
+        updates.append((status, attempts, error, now + backoff, r['id']))
+    store.executemany("""
+        UPDATE intake SET status = ?, attempts = ?, last_error = ?,
+                          next_attempt_at = ?, lease_until = 0
+        WHERE id = ?
+    """, updates)
+
+
+def _insert_passes(cursor, payloads):
+    """
+    Insert queued passes; returns {intake_id: error} for rows MySQL rejected.
+
+    The batch goes in with one statement. If it is refused for anything but
+    a connection problem (e.g. an unknown student, a value pymysql cannot
+    encode), the rows are retried one by one so only the bad rows fail.
+    Connection errors propagate so the whole batch is retried.
+    """
+    sql = """
+        INSERT INTO gate_pass_requests
+        (reason, from_time, to_time, status, student_id, qr_code, intake_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE intake_id = intake_id
+    """
+    params = {intake_id: (p['reason'], p['from_time'], p['to_time'], p['status'],
+                          p['student_id'], p['qr_token'], intake_id)
+              for intake_id, p in payloads.items()}
+    try:
+        cursor.executemany(sql, list(params.values()))
+        return {}
+    except _CONNECTION_ERRORS:
+        raise
+    except Exception:
+        pass
+
+    # A failed statement is rolled back on its own; earlier rows are unaffected
+    rejected = {}
+    for intake_id, row in params.items():
+        try:
+            cursor.execute(sql, row)
+        except _CONNECTION_ERRORS:
+            raise
+        except Exception as e:
+            detail = e.args[-1] if isinstance(e, pymysql.MySQLError) and e.args else e
+            rejected[intake_id] = f"Rejected by database: {detail}"
+    return rejected
+
+
+def drain_shard(shard, batch_size=INTAKE_BATCH_SIZE):
+    """Write one batch of queued passes to a shard; returns passes written"""
+    now = time.time()
+    rows = _claim(shard, batch_size, now)
+    if not rows:
+        return 0
+
+    payloads = {r['id']: json.loads(r['payload']) for r in rows}
+    placeholders = ', '.join(['%s'] * len(payloads))
+    conn = cursor = None
+
+    try:
+        conn = get_db_connection(shard)
+        cursor = conn.cursor()
+        _ensure_intake_column(cursor, shard)
+        ensure_events_table(cursor)
+
+        lookup = f"SELECT id, intake_id FROM gate_pass_requests WHERE intake_id IN ({placeholders})"
+
+        # Entries written by a drainer that died before marking them done
+        cursor.execute(lookup, list(payloads))
+        existing = {r['intake_id'] for r in cursor.fetchall()}
+
+        rejected = _insert_passes(cursor, {
+            intake_id: p for intake_id, p in payloads.items() if intake_id not in existing
+        })
+
+        cursor.execute(lookup, list(payloads))
+        pass_ids = {r['intake_id']: r['id'] for r in cursor.fetchall()}
+        created = [pass_id for intake_id, pass_id in pass_ids.items() if intake_id not in existing]
+
+        record_pass_events(cursor, created, EVENT_CREATED)
+        conn.commit()
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"Intake drain to shard '{shard}' failed: {e}")
+        _schedule_retry(rows, str(e), now)
+        return 0
+    finally:
+        if cursor:
+            cursor.close()
+        close_db_connection(conn)
+
+    # Render before marking done so a done entry's QR image exists
+    qr_jobs = [(pass_id, payloads[intake_id]['qr_token']) for intake_id, pass_id in pass_ids.items()]
+    qr_errors = {}
+    for intake_id, error in zip(pass_ids, render_qr_batch(qr_jobs)):
+        if error:
+            print(f"QR generation failed for pass {pass_ids[intake_id]}: {error}")
+            qr_errors[intake_id] = error
+
+    store = _store()
+    store.execute("BEGIN IMMEDIATE")
+    store.executemany(
+        "UPDATE intake SET status = ?, pass_id = ?, qr_error = ?, lease_until = 0 WHERE id = ?",
+        [(STATUS_DONE, pass_id, qr_errors.get(intake_id), intake_id)
+         for intake_id, pass_id in pass_ids.items()]
+    )
+    store.executemany(
+        "UPDATE intake SET status = ?, last_error = ?, lease_until = 0 WHERE id = ?",
+        [(STATUS_FAILED, rejected.get(intake_id, 'Rejected by database'), intake_id)
+         for intake_id in payloads if intake_id not in pass_ids]
+    )
+    store.execute("COMMIT")
+
+    return len(created)
+
+
+def drain_once(batch_size=INTAKE_BATCH_SIZE):
+    """Drain one batch from every shard; returns passes written"""
+    return sum(drain_shard(shard, batch_size) for shard in DB_SHARDS)
+
+
+def prune_done(max_age=DONE_RETENTION_SECONDS):
+    """Forget completed entries older than max_age seconds"""
+    _store().execute(
+        "DELETE FROM intake WHERE status = ? AND created_at < ?",
+        (STATUS_DONE, time.time() - max_age)
+    )
+
+
+def run_drainer(stop_event=None, interval=INTAKE_DRAIN_INTERVAL):
+    """Drain the queue until stop_event is set"""
+    stop_event = stop_event or threading.Event()
+    last_prune = 0
+    while not stop_event.is_set():
+        try:
+            written = drain_once()
+            if written:
+                print(f"Drained {written} queued passes")
+            if time.time() - last_prune > 3600:
+                prune_done()
+                last_prune = time.time()
+        except Exception as e:
+            print(f"Intake drainer error: {e}")
+        stop_event.wait(interval)
+
+
+def start_drainer():
+    """Start a background drainer thread in this process (once)"""
+    global _drainer
+    if _drainer is None or not _drainer.is_alive():
+        _drainer = threading.Thread(target=run_drainer, name='intake-drainer', daemon=True)
+        _drainer.start()
+    return _drainer
@@ -0,0 +1,73 @@
+"""
+Fast JSON provider for Flask
+
+Encodes responses with orjson when it is installed (falling back to the
+stdlib json module) and serialises datetimes natively as ISO 8601, so routes
+can hand rows straight to jsonify without formatting every value first.
+
+Enable it on the app:
+    from backend.json_provider import init_app
+    init_app(app)
+"""
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """Encode the extra types pymysql hands back"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (Decimal, timedelta)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        """Serialise obj to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(s):
+        return orjson.loads(s)
+else:
+    def dumps_bytes(obj):
+        """Serialise obj to UTF-8 JSON bytes"""
+        return json.dumps(obj, default=_default, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+    def loads(s):
+        return json.loads(s)
+
+
+class FastJSONProvider(JSONProvider):
+    """JSONProvider that writes response bodies as bytes in one pass"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Install FastJSONProvider as the app's JSON provider"""
+    app.json = FastJSONProvider(app)
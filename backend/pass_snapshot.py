@@ -0,0 +1,106 @@
+"""
+Binary pass snapshot and delta encoding for offline gate scanners
+
+Scanners keep a local copy of the currently valid passes and look scans up
+offline. A scan is matched on token_hash(pass_id, qr_token), so the QR tokens
+themselves never leave the server.
+
+Snapshot (little-endian):
+    header  '<4sBQQIIB' magic b'SGPS', version, seq, sync time (epoch),
+                        record count, bloom bits (m), bloom hash count (k)
+    records '<I8sII'    pass_id, token hash, from epoch, to epoch
+                        (sorted by pass_id)
+    bloom   m / 8 bytes over the token hashes, for fast negative checks
+
+Delta:
+    header  '<4sBQQQQI' magic b'SGPD', version, since seq, upto seq,
+                        since time, sync time (epoch), count
+    records '<BI8sII'   op, pass_id, token hash, from epoch, to epoch
+                        (OP_REMOVE records carry zeroed hash and window)
+
+A scanner keeps the (seq, sync time) pair from its last response and sends
+both back on the next /deltas call. Expiry removals cover passes whose window
+ended in [since time, sync time), so the cursor advances on every poll even
+when no events happened.
+"""
+import hashlib
+import struct
+
+FORMAT_VERSION = 2
+
+SNAPSHOT_MAGIC = b'SGPS'
+DELTA_MAGIC = b'SGPD'
+
+SNAPSHOT_HEADER = struct.Struct('<4sBQQIIB')
+SNAPSHOT_RECORD = struct.Struct('<I8sII')
+DELTA_HEADER = struct.Struct('<4sBQQQQI')
+DELTA_RECORD = struct.Struct('<BI8sII')
+
+OP_UPSERT = 1
+OP_REMOVE = 2
+
+BLOOM_BITS_PER_ENTRY = 10
+BLOOM_HASHES = 7
+
+_NO_HASH = b'\x00' * 8
+
+
+def token_hash(pass_id, qr_token):
+    """8-byte digest identifying a (pass, QR token) pair"""
+    return hashlib.sha256(f"{pass_id}|{qr_token}".encode('utf-8')).digest()[:8]
+
+
+def epoch(value):
+    return int(value.timestamp()) if value else 0
+
+
+def _bloom_positions(digest, m, k):
+    h1, h2 = struct.unpack('<II', digest)
+    h2 |= 1
+    return [(h1 + i * h2) % m for i in range(k)]
+
+
+def build_bloom(digests, bits_per_entry=BLOOM_BITS_PER_ENTRY, k=BLOOM_HASHES):
+    """Bloom filter over token hashes; returns (bit count, bytes)"""
+    m = max(64, -(-len(digests) * bits_per_entry // 8) * 8)
+    bits = bytearray(m // 8)
+    for digest in digests:
+        for pos in _bloom_positions(digest, m, k):
+            bits[pos >> 3] |= 1 << (pos & 7)
+    return m, bytes(bits)
+
+
+def bloom_contains(bits, m, k, digest):
+    """True if digest may be in the filter, False if it definitely is not"""
+    return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in _bloom_positions(digest, m, k))
+
+
+def encode_snapshot(seq, sync_time, rows):
+    """Encode valid passes (dicts with id, qr_code, from_time, to_time)"""
+    records = sorted(
+        (r['id'], token_hash(r['id'], r['qr_code']), epoch(r['from_time']), epoch(r['to_time']))
+        for r in rows
+    )
+    m, bloom = build_bloom([rec[1] for rec in records])
+
+    out = bytearray(SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, FORMAT_VERSION, seq, sync_time, len(records), m, BLOOM_HASHES
+    ))
+    for rec in records:
+        out += SNAPSHOT_RECORD.pack(*rec)
+    out += bloom
+    return bytes(out)
+
+
+def encode_deltas(since, upto, since_time, sync_time, upserts, removals):
+    """Encode a delta: upserts are pass rows, removals are pass ids"""
+    records = [
+        DELTA_RECORD.pack(OP_UPSERT, r['id'], token_hash(r['id'], r['qr_code']),
+                          epoch(r['from_time']), epoch(r['to_time']))
+        for r in upserts
+    ]
+    records += [DELTA_RECORD.pack(OP_REMOVE, pass_id, _NO_HASH, 0, 0) for pass_id in removals]
+
+    header = DELTA_HEADER.pack(DELTA_MAGIC, FORMAT_VERSION, since, upto,
+                               since_time, sync_time, len(records))
+    return header + b''.join(records)
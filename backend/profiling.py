@@ -0,0 +1,124 @@
+"""
+Opt-in per-request sampling profiler
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is
+picked by PROFILE_SAMPLE_RATE. A background thread then samples the request
+thread's stack every PROFILE_INTERVAL_MS. When the request finishes, the
+samples are written to PROFILE_DIR in collapsed-stack format
+("frame;frame;frame count" per line), which flamegraph.pl, speedscope and
+inferno read directly. Only the newest PROFILE_MAX_FILES profiles are kept.
+
+Every response from an instrumented blueprint also carries a Server-Timing
+header with the request's total DB time (connect + statements).
+
+Usage, once per blueprint module:
+    install_profiling(passes_bp)
+"""
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from flask import request, g
+
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join('data', 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '500'))
+
+_rotate_lock = threading.Lock()
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval_ms=PROFILE_INTERVAL_MS):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _wants_profile():
+    token = request.headers.get('X-Profile')
+    if token and PROFILE_TOKEN and token == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _write_profile(sampler, profile_id):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{request.endpoint}-{profile_id}.folded"
+    with open(os.path.join(PROFILE_DIR, name), 'w') as fh:
+        fh.write(sampler.collapsed())
+    _rotate_profiles()
+
+
+def _rotate_profiles():
+    """Delete the oldest profiles beyond PROFILE_MAX_FILES"""
+    with _rotate_lock:
+        with os.scandir(PROFILE_DIR) as entries:
+            profiles = [e for e in entries if e.name.endswith('.folded') and e.is_file()]
+        if len(profiles) <= PROFILE_MAX_FILES:
+            return
+        profiles.sort(key=lambda e: e.stat().st_mtime)
+        for entry in profiles[:len(profiles) - PROFILE_MAX_FILES]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def install_profiling(bp):
+    """Register profiling and DB timing hooks on a blueprint"""
+
+    @bp.before_request
+    def _start_profile():
+        g._db_ms = 0.0
+        if _wants_profile():
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+            g._profiler = sampler
+
+    @bp.after_request
+    def _finish_profile(response):
+        response.headers['Server-Timing'] = f"db;dur={g.get('_db_ms', 0.0):.2f}"
+        sampler = g.pop('_profiler', None)
+        if sampler is not None:
+            sampler.stop()
+            profile_id = uuid.uuid4().hex[:12]
+            try:
+                _write_profile(sampler, profile_id)
+                response.headers['X-Profile-Id'] = profile_id
+            except OSError as e:
+                print(f"Failed to write profile: {e}")
+        return response
+
+    @bp.teardown_request
+    def _abort_profile(exc):
+        sampler = g.pop('_profiler', None)
+        if sampler is not None:
+            sampler.stop()
@@ -0,0 +1,61 @@
+"""
+QR image rendering for passes
+
+Single passes render inline; batches (bulk creation, intake queue drains)
+render across cores in a shared process pool. Pool workers are spawned
+rather than forked: the pool is created lazily from a request or drainer
+thread, and forking a threaded process can copy locks held by other threads.
+"""
+import multiprocessing
+import os
+import qrcode
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+QR_DIR = os.path.join('static', 'qr_codes')
+
+_pool = None
+
+
+def qr_paths(qr_token):
+    """Filesystem path and public URL of a pass QR image"""
+    qr_filename = f"{qr_token}.png"
+    return os.path.join(QR_DIR, qr_filename), f"/static/qr_codes/{qr_filename}"
+
+
+def qr_payload(pass_id, qr_token):
+    """Text encoded in a pass QR code"""
+    return f"REQ:{pass_id}|QR:{qr_token}"
+
+
+def _render(job):
+    """Render one QR image; returns an error message or None"""
+    payload, path = job
+    try:
+        qrcode.make(payload).save(path)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pool
+
+
+def render_qr_batch(passes):
+    """Render QR images for [(pass_id, qr_token)] in parallel; returns errors in order"""
+    global _pool
+    os.makedirs(QR_DIR, exist_ok=True)
+    jobs = [(qr_payload(pass_id, token), qr_paths(token)[0]) for pass_id, token in passes]
+    try:
+        return list(_get_pool().map(_render, jobs, chunksize=16))
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool on the next call
+        _pool = None
+        raise
@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify
+from backend.config import shard_for, request_shard_key, ShardKeyError
+from backend.db.archive import archived_months, query_archive, archive_dir_for, PASSES_TABLE, QR_TABLE, ATTENDANCE_TABLE
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_BULK
+
+archive_bp = Blueprint('archive', __name__)
+install_profiling(archive_bp)
+install_admission_control(archive_bp, priority=PRIORITY_BULK)
+
+@archive_bp.route('/months', methods=['GET'])
+def list_months():
+    """List months available in the pass archive"""
+    try:
+        archive_dir = archive_dir_for(shard_for(request_shard_key()))
+        return jsonify(archived_months(archive_dir=archive_dir)), 200
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@archive_bp.route('/passes', methods=['GET'])
+def get_archived_passes():
+    """Query archived passes by month range, reading archive files on demand"""
+    try:
+        from_month = request.args.get('from')
+        to_month = request.args.get('to')
+        limit = request.args.get('limit', default=1000, type=int)
+        
+        if not from_month and not to_month:
+            return jsonify({"error": "Provide 'from' and/or 'to' month (YYYY-MM)"}), 400
+        
+        filters = {}
+        for column in ['id', 'student_id', 'faculty_id', 'status', 'pass_id', 'request_id']:
+            value = request.args.get(column)
+            if value:
+                filters[column] = value
+        
+        tables = {QR_TABLE: QR_TABLE, ATTENDANCE_TABLE: ATTENDANCE_TABLE}
+        table = tables.get(request.args.get('table'), PASSES_TABLE)
+        
+        archive_dir = archive_dir_for(shard_for(request_shard_key()))
+        rows = query_archive(table, from_month, to_month, filters, limit, archive_dir)
+        return jsonify(rows), 200
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
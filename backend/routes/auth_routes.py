@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
-from backend.config import get_db_connection, close_db_connection
+from backend.config import get_db_connection, close_db_connection, ShardKeyError
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_NORMAL
 import bcrypt
 import pymysql
 import jwt
@@ -7,6 +9,8 @@ import os
 from datetime import datetime, timedelta
 
 auth_bp = Blueprint('auth', __name__)
+install_profiling(auth_bp)
+install_admission_control(auth_bp, priority=PRIORITY_NORMAL)
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 
@@ -56,6 +60,8 @@ def login():
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -89,5 +95,7 @@ def register():
             close_db_connection(conn)
     except pymysql.IntegrityError:
         return jsonify({"error": "User already exists"}), 409
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,8 +1,24 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, request, jsonify
+from backend.db.query_log import slow_queries, SLOW_QUERY_MS
+from backend.profiling import install_profiling, PROFILE_TOKEN
+from backend.admission import install_admission_control, PRIORITY_BULK
 
 dashboard_bp = Blueprint('dashboard', __name__)
+install_profiling(dashboard_bp)
+install_admission_control(dashboard_bp, priority=PRIORITY_BULK)
 
 @dashboard_bp.route('/test', methods=['GET'])
 def test():
     """Test endpoint"""
     return jsonify({'message': 'Dashboard routes working'}), 200
+
+@dashboard_bp.route('/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """Recent slow statements captured by this worker (admin only)"""
+    if not PROFILE_TOKEN or request.headers.get('X-Profile-Token') != PROFILE_TOKEN:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    return jsonify({
+        "threshold_ms": SLOW_QUERY_MS,
+        "queries": slow_queries()
+    }), 200
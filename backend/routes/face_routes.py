@@ -1,15 +1,29 @@
 from flask import Blueprint, request, jsonify
-from backend.config import get_db_connection, close_db_connection
+from werkzeug.exceptions import RequestEntityTooLarge
+from backend.config import get_db_connection, close_db_connection, ShardKeyError
+from backend.face_ingest import ingest_face_image, IngestError, MAX_FACE_UPLOAD_BYTES
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_GATE
 import pymysql
 
 face_bp = Blueprint("face", __name__)
+install_profiling(face_bp)
+install_admission_control(face_bp, priority=PRIORITY_GATE)
 
 @face_bp.route("/verify-face", methods=["POST"])
 def verify_face_endpoint():
     """Verify face from uploaded image"""
     try:
-        if "file" not in request.files:
-            return jsonify({"error": "No image provided"}), 400
+        # Multipart overhead aside, anything this large cannot pass the ingest limit.
+        # Enforced while the body is read, so chunked uploads without a
+        # Content-Length are cut off too.
+        request.max_content_length = MAX_FACE_UPLOAD_BYTES + 64 * 1024
+        
+        try:
+            if "file" not in request.files:
+                return jsonify({"error": "No image provided"}), 400
+        except RequestEntityTooLarge:
+            return jsonify({"error": "Image too large"}), 413
         
         file = request.files["file"]
         name = request.form.get("name", type=str)
@@ -18,7 +32,12 @@ def verify_face_endpoint():
         if not name and not student_id:
             return jsonify({"error": "Provide 'name' or 'student_id'"}), 400
         
-        # In production, compute embedding and compare with stored embedding
+        try:
+            face, face_detected = ingest_face_image(file)
+        except IngestError as e:
+            return jsonify({"error": str(e)}), e.status
+        
+        # In production, compute embedding of `face` and compare with stored embedding
         
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -42,10 +61,13 @@ def verify_face_endpoint():
                 "match": True,
                 "similarity": 0.95,
                 "name": name if name else student_id,
-                "student_id": row['id']
+                "student_id": row['id'],
+                "face_detected": face_detected
             }), 200
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,8 +1,21 @@
 from flask import Blueprint, request, jsonify
-from backend.config import get_db_connection, close_db_connection
+from backend.config import get_db_connection, close_db_connection, scatter_gather, should_scatter, ShardKeyError
+from backend.db.pass_events import ensure_events_table, record_pass_event, STATUS_EVENTS
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_NORMAL
 import pymysql
 
 faculty_bp = Blueprint('faculty', __name__)
+install_profiling(faculty_bp)
+install_admission_control(faculty_bp, priority=PRIORITY_NORMAL)
+
+# Response shape for get_requests, built by MySQL so rows can be returned as-is
+PENDING_REQUEST_PROJECTION = """
+    r.id, r.reason,
+    DATE_FORMAT(r.from_time, '%Y-%m-%d %H:%i') AS from_time,
+    DATE_FORMAT(r.to_time, '%Y-%m-%d %H:%i') AS to_time,
+    r.status, s.name AS student_name, s.student_id
+"""
 
 @faculty_bp.route('/approve-request', methods=['POST'])
 def approve_request():
@@ -20,11 +33,14 @@ def approve_request():
         cursor = conn.cursor()
         
         try:
+            ensure_events_table(cursor)
+            
             # Update pass status
             cursor.execute(
                 "UPDATE gate_pass_requests SET status=%s WHERE id=%s",
                 (data['decision'], data['request_id'])
             )
+            record_pass_event(cursor, data['request_id'], STATUS_EVENTS[data['decision']])
             conn.commit()
             
             return jsonify({
@@ -33,37 +49,43 @@ def approve_request():
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _fetch_pending_requests(cursor):
+    cursor.execute(f"""
+        SELECT {PENDING_REQUEST_PROJECTION}
+        FROM gate_pass_requests r
+        JOIN students s ON r.student_id = s.id
+        WHERE r.status = 'Pending'
+        ORDER BY r.from_time DESC
+    """)
+    return cursor.fetchall()
+
 @faculty_bp.route('/get-requests', methods=['GET'])
 def get_requests():
     """Get all pending requests for a faculty member"""
     try:
+        if should_scatter():
+            merged = []
+            for shard, rows in scatter_gather(_fetch_pending_requests).items():
+                for row in rows:
+                    row['shard'] = shard
+                merged.extend(rows)
+            merged.sort(key=lambda r: r['from_time'] or '', reverse=True)
+            return jsonify(merged), 200
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
         try:
-            cursor.execute("""
-                SELECT r.id, r.reason, r.from_time, r.to_time, r.status,
-                       s.name AS student_name, s.student_id
-                FROM gate_pass_requests r
-                JOIN students s ON r.student_id = s.id
-                WHERE r.status = 'Pending'
-                ORDER BY r.from_time DESC
-            """)
-            
-            requests = cursor.fetchall()
-            
-            for req in requests:
-                if hasattr(req.get('from_time'), 'strftime'):
-                    req["from_time"] = req["from_time"].strftime("%Y-%m-%d %H:%M")
-                if hasattr(req.get('to_time'), 'strftime'):
-                    req["to_time"] = req["to_time"].strftime("%Y-%m-%d %H:%M")
-            
-            return jsonify(requests), 200
+            return jsonify(_fetch_pending_requests(cursor)), 200
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
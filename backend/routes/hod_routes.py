@@ -1,8 +1,13 @@
 from flask import Blueprint, request, jsonify
-from backend.config import get_db_connection, close_db_connection
+from backend.config import get_db_connection, close_db_connection, scatter_gather, should_scatter, ShardKeyError
+from backend.db.pass_events import ensure_events_table, record_pass_event, STATUS_EVENTS
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_NORMAL
 import pymysql
 
 hod_bp = Blueprint('hod', __name__)
+install_profiling(hod_bp)
+install_admission_control(hod_bp, priority=PRIORITY_NORMAL)
 
 @hod_bp.route('/approve-request', methods=['POST'])
 def approve_request():
@@ -20,12 +25,15 @@ def approve_request():
         cursor = conn.cursor()
         
         try:
+            ensure_events_table(cursor)
+            
             approver_id = data.get('approver_id')
             
             cursor.execute(
                 "UPDATE gate_pass_requests SET status=%s, approved_by=%s WHERE id=%s",
                 (data['decision'], approver_id, data['request_id'])
             )
+            record_pass_event(cursor, data['request_id'], STATUS_EVENTS[data['decision']])
             conn.commit()
             
             return jsonify({
@@ -34,36 +42,44 @@ def approve_request():
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+STAT_FIELDS = ['total_passes', 'approved', 'rejected', 'pending']
+
+def _fetch_stats(cursor):
+    cursor.execute("""
+        SELECT 
+            COUNT(*) as total_passes,
+            SUM(CASE WHEN status='Approved' THEN 1 ELSE 0 END) as approved,
+            SUM(CASE WHEN status='Rejected' THEN 1 ELSE 0 END) as rejected,
+            SUM(CASE WHEN status='Pending' THEN 1 ELSE 0 END) as pending
+        FROM gate_pass_requests
+    """)
+    stats = cursor.fetchone()
+    return {field: int(stats[field] or 0) for field in STAT_FIELDS}
+
 @hod_bp.route('/stats', methods=['GET'])
 def get_stats():
     """Get statistics for HOD dashboard"""
     try:
+        if should_scatter():
+            per_shard = scatter_gather(_fetch_stats)
+            totals = {field: sum(s[field] for s in per_shard.values()) for field in STAT_FIELDS}
+            totals['shards'] = per_shard
+            return jsonify(totals), 200
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
         try:
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_passes,
-                    SUM(CASE WHEN status='Approved' THEN 1 ELSE 0 END) as approved,
-                    SUM(CASE WHEN status='Rejected' THEN 1 ELSE 0 END) as rejected,
-                    SUM(CASE WHEN status='Pending' THEN 1 ELSE 0 END) as pending
-                FROM gate_pass_requests
-            """)
-            
-            stats = cursor.fetchone()
-            
-            return jsonify({
-                "total_passes": stats['total_passes'] or 0,
-                "approved": stats['approved'] or 0,
-                "rejected": stats['rejected'] or 0,
-                "pending": stats['pending'] or 0
-            }), 200
+            return jsonify(_fetch_stats(cursor)), 200
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
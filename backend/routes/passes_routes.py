@@ -1,11 +1,32 @@
 from flask import Blueprint, request, jsonify
-from backend.config import get_db_connection, close_db_connection
+from backend.config import get_db_connection, close_db_connection, scatter_gather, should_scatter, shard_for, request_shard_key, ShardKeyError
+from backend.db.pass_events import ensure_events_table, record_pass_event, record_pass_events, STATUS_EVENTS, EVENT_CREATED
+from backend.qr_images import qr_paths, qr_payload, render_qr_batch
+from backend.intake_queue import enqueue_pass, get_intake, STATUS_DONE
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_NORMAL
+from datetime import datetime
 import pymysql
 import os
 import qrcode
 import uuid
 
 passes_bp = Blueprint("passes", __name__)
+install_profiling(passes_bp)
+install_admission_control(passes_bp, priority=PRIORITY_NORMAL)
+
+# Response shape for list_passes, built by MySQL so rows can be returned as-is
+PASS_LIST_PROJECTION = """
+    r.id,
+    IFNULL(DATE_FORMAT(r.from_time, '%Y-%m-%d'), '') AS date,
+    IFNULL(DATE_FORMAT(r.from_time, '%H:%i'), '') AS time,
+    r.reason,
+    COALESCE(NULLIF(r.status, ''), 'Pending') AS status,
+    COALESCE(NULLIF(f.name, ''), 'Unassigned') AS faculty,
+    r.student_id AS studentId
+"""
+
+MAX_BULK_PASSES = 500
 
 def ensure_tables_exist(cursor):
     """Ensure all required tables exist"""
@@ -18,52 +39,52 @@ def ensure_tables_exist(cursor):
             status VARCHAR(32) DEFAULT 'Pending',
             faculty_id INT NULL,
             student_id INT NOT NULL,
-            qr_code VARCHAR(255) NULL,
+            qr_code VARCHAR(255) NULL UNIQUE,
             rejection_reason TEXT NULL,
             approved_at DATETIME NULL,
             rejected_at DATETIME NULL,
-            approved_by INT NULL
+            approved_by INT NULL,
+            intake_id VARCHAR(36) NULL UNIQUE
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
     """)
+    ensure_events_table(cursor)
+
+def _fetch_pass_list(cursor):
+    ensure_tables_exist(cursor)
+    cursor.execute(f"""
+        SELECT {PASS_LIST_PROJECTION}
+        FROM gate_pass_requests r
+        LEFT JOIN faculty f ON r.faculty_id = f.id
+        ORDER BY COALESCE(r.from_time, NOW()) DESC
+    """)
+    return cursor.fetchall()
 
 @passes_bp.route('/passes', methods=['GET'])
 def list_passes():
     """List all passes"""
     try:
+        if should_scatter():
+            merged = []
+            for shard, rows in scatter_gather(_fetch_pass_list).items():
+                for row in rows:
+                    row['shard'] = shard
+                merged.extend(rows)
+            # Undated passes sort at the current time, as COALESCE(from_time, NOW()) does per shard
+            now = datetime.now()
+            today, now_time = now.strftime('%Y-%m-%d'), now.strftime('%H:%M')
+            merged.sort(key=lambda r: (r['date'] or today, r['time'] if r['date'] else now_time), reverse=True)
+            return jsonify(merged), 200
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
         try:
-            ensure_tables_exist(cursor)
-            cursor.execute("""
-                SELECT r.id, r.reason, r.from_time, r.to_time, r.status,
-                       f.name AS faculty_name, r.student_id
-                FROM gate_pass_requests r
-                LEFT JOIN faculty f ON r.faculty_id = f.id
-                ORDER BY COALESCE(r.from_time, NOW()) DESC
-            """)
-            
-            rows = cursor.fetchall()
-            result = []
-            
-            for r in rows:
-                from_time = r['from_time'].strftime('%Y-%m-%d %H:%M') if r.get('from_time') else ''
-                to_time = r['to_time'].strftime('%Y-%m-%d %H:%M') if r.get('to_time') else ''
-                
-                result.append({
-                    'id': r['id'],
-                    'date': from_time[:10] if from_time else '',
-                    'time': from_time[11:16] if from_time else '',
-                    'reason': r['reason'],
-                    'status': r['status'] or 'Pending',
-                    'faculty': r.get('faculty_name') or 'Unassigned',
-                    'studentId': r.get('student_id'),
-                })
-            
-            return jsonify(result), 200
+            return jsonify(_fetch_pass_list(cursor)), 200
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -99,19 +120,18 @@ def create_pass():
             try:
                 os.makedirs('static/qr_codes', exist_ok=True)
                 qr_token = str(uuid.uuid4())
-                qr_payload = f"REQ:{created_id}|QR:{qr_token}"
-                qr_filename = f"{qr_token}.png"
-                qr_path = os.path.join('static', 'qr_codes', qr_filename)
+                qr_path, qr_url = qr_paths(qr_token)
                 
-                qrcode.make(qr_payload).save(qr_path)
+                qrcode.make(qr_payload(created_id, qr_token)).save(qr_path)
                 
                 cursor.execute(
                     "UPDATE gate_pass_requests SET qr_code = %s WHERE id = %s",
                     (qr_token, created_id)
                 )
+                record_pass_event(cursor, created_id, EVENT_CREATED)
                 conn.commit()
                 
-                relative_qr_path = f"/static/qr_codes/{qr_filename}"
+                relative_qr_path = qr_url
             except Exception as e:
                 print(f"QR generation failed: {e}")
                 relative_qr_path = None
@@ -127,6 +147,167 @@ def create_pass():
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@passes_bp.route('/passes/bulk', methods=['POST'])
+def create_passes_bulk():
+    """Create identical passes for a group of students in one transaction"""
+    try:
+        data = request.get_json()
+        
+        if not all(k in data for k in ['date', 'time', 'reason', 'studentIds']):
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        student_ids = data['studentIds']
+        if not isinstance(student_ids, list) or not student_ids:
+            return jsonify({"error": "studentIds must be a non-empty list"}), 400
+        if len(student_ids) > MAX_BULK_PASSES:
+            return jsonify({"error": f"At most {MAX_BULK_PASSES} passes per request"}), 400
+        
+        status = data.get('status', 'Pending')
+        from_datetime = f"{data['date']} {data['time']}"
+        
+        results = [{'studentId': sid} for sid in student_ids]
+        pending = {}
+        for result in results:
+            sid = result['studentId']
+            if isinstance(sid, bool) or not isinstance(sid, (int, str)) or not str(sid).isdecimal():
+                result['error'] = 'Invalid student id'
+            elif int(sid) in pending:
+                result['error'] = 'Duplicate student id'
+            else:
+                pending[int(sid)] = result
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            ensure_tables_exist(cursor)
+            
+            if pending:
+                placeholders = ', '.join(['%s'] * len(pending))
+                cursor.execute(f"SELECT id FROM students WHERE id IN ({placeholders})", list(pending))
+                known = {r['id'] for r in cursor.fetchall()}
+                for sid in list(pending):
+                    if sid not in known:
+                        pending.pop(sid)['error'] = 'Student not found'
+            
+            if pending:
+                tokens = {sid: str(uuid.uuid4()) for sid in pending}
+                
+                cursor.executemany("""
+                    INSERT INTO gate_pass_requests 
+                    (reason, from_time, to_time, status, student_id, qr_code)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, [(data['reason'], from_datetime, from_datetime, status, sid, token)
+                      for sid, token in tokens.items()])
+                
+                placeholders = ', '.join(['%s'] * len(tokens))
+                cursor.execute(
+                    f"SELECT id, qr_code FROM gate_pass_requests WHERE qr_code IN ({placeholders})",
+                    list(tokens.values())
+                )
+                id_by_token = {r['qr_code']: r['id'] for r in cursor.fetchall()}
+                
+                record_pass_events(cursor, list(id_by_token.values()), EVENT_CREATED)
+                conn.commit()
+                
+                for sid, token in tokens.items():
+                    pending[sid].update({'id': id_by_token[token], 'qrCode': qr_paths(token)[1]})
+                
+                # The passes are committed: a render failure only loses the images
+                try:
+                    errors = render_qr_batch([(id_by_token[token], token) for token in tokens.values()])
+                except Exception as e:
+                    errors = [str(e)] * len(tokens)
+                for sid, error in zip(tokens, errors):
+                    if error:
+                        print(f"QR generation failed: {error}")
+                        pending[sid]['qrCode'] = None
+            
+            created = sum(1 for r in results if 'id' in r)
+            return jsonify({
+                'date': data['date'],
+                'time': data['time'],
+                'reason': data['reason'],
+                'status': status,
+                'created': created,
+                'failed': len(results) - created,
+                'results': results
+            }), 201 if created else 400
+        finally:
+            cursor.close()
+            close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@passes_bp.route('/passes/queued', methods=['POST'])
+def queue_pass():
+    """Accept a pass into the write-behind queue and acknowledge immediately"""
+    try:
+        data = request.get_json()
+        
+        if not all(k in data for k in ['date', 'time', 'reason']):
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        student_id = data.get('studentId') or data.get('student_id') or 1
+        status = data.get('status', 'Pending')
+        from_datetime = f"{data['date']} {data['time']}"
+        
+        # Nothing reaches MySQL until the drainer runs, so reject bad rows up front
+        if not isinstance(data['reason'], str) or not data['reason'].strip():
+            return jsonify({"error": "Invalid reason"}), 400
+        if isinstance(student_id, bool) or not isinstance(student_id, (int, str)) or not str(student_id).isdecimal():
+            return jsonify({"error": "Invalid student id"}), 400
+        if status not in ['Pending', 'Approved', 'Rejected']:
+            return jsonify({"error": "Invalid status"}), 400
+        try:
+            datetime.strptime(from_datetime, '%Y-%m-%d %H:%M')
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid date or time, expected YYYY-MM-DD and HH:MM"}), 400
+        
+        provisional_id = enqueue_pass(
+            shard_for(request_shard_key()), data['reason'],
+            from_datetime, from_datetime, status, int(student_id)
+        )
+        
+        return jsonify({
+            'provisionalId': provisional_id,
+            'date': data['date'],
+            'time': data['time'],
+            'reason': data['reason'],
+            'status': status,
+            'queueStatus': 'queued'
+        }), 202
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@passes_bp.route('/passes/queued/<provisional_id>', methods=['GET'])
+def get_queued_pass(provisional_id):
+    """Look up a queued pass by provisional id"""
+    try:
+        entry = get_intake(provisional_id)
+        
+        if not entry:
+            return jsonify({"error": "Queued pass not found"}), 404
+        
+        done = entry['status'] == STATUS_DONE
+        has_qr = done and not entry['qr_error']
+        return jsonify({
+            'provisionalId': entry['id'],
+            'queueStatus': entry['status'],
+            'id': entry['pass_id'],
+            'qrCode': qr_paths(entry['qr_token'])[1] if has_qr else None,
+            'attempts': entry['attempts'],
+            'error': entry['qr_error'] if done else entry['last_error']
+        }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -163,6 +344,7 @@ def update_pass_status(pass_id):
             update_params.append(pass_id)
             
             cursor.execute(update_sql, update_params)
+            record_pass_event(cursor, pass_id, STATUS_EVENTS[new_status])
             conn.commit()
             
             return jsonify({
@@ -171,5 +353,7 @@ def update_pass_status(pass_id):
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,11 +1,16 @@
 from flask import Blueprint, request, jsonify
-from backend.config import get_db_connection, close_db_connection
+from backend.config import get_db_connection, close_db_connection, ShardKeyError
+from backend.db.pass_events import ensure_events_table, record_pass_event, EVENT_REISSUED
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_GATE
 import qrcode
 import uuid
 import os
 import pymysql
 
 qr_bp = Blueprint("qr", __name__)
+install_profiling(qr_bp)
+install_admission_control(qr_bp, priority=PRIORITY_GATE)
 
 QR_DIR = os.path.join('static', 'qr_codes')
 os.makedirs(QR_DIR, exist_ok=True)
@@ -51,6 +56,7 @@ def generate_qr_for_pass(pass_id):
         cursor = conn.cursor()
         
         try:
+            ensure_events_table(cursor)
             cursor.execute("SELECT * FROM gate_pass_requests WHERE id = %s", (pass_id,))
             pass_record = cursor.fetchone()
             
@@ -67,6 +73,7 @@ def generate_qr_for_pass(pass_id):
                 "UPDATE gate_pass_requests SET qr_code = %s WHERE id = %s",
                 (qr_token, pass_id)
             )
+            record_pass_event(cursor, pass_id, EVENT_REISSUED)
             conn.commit()
             
             relative_path = qr_path.replace(os.sep, '/')
@@ -80,6 +87,8 @@ def generate_qr_for_pass(pass_id):
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -133,5 +142,7 @@ def verify_qr_code():
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
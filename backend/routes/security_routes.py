@@ -1,9 +1,19 @@
-from flask import Blueprint, request, jsonify
-from backend.config import get_db_connection, close_db_connection
+from flask import Blueprint, request, jsonify, Response
+from backend.config import get_db_connection, close_db_connection, ShardKeyError
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_GATE
+from backend.db.pass_events import ensure_events_table
+from backend.pass_snapshot import encode_snapshot, encode_deltas, epoch
 from datetime import datetime
 import pymysql
 
 security_bp = Blueprint('security', __name__)
+install_profiling(security_bp)
+install_admission_control(security_bp, priority=PRIORITY_GATE)
+
+# Events younger than this are left for the next sync, so a transaction that
+# took an earlier seq but committed later is never skipped by a scanner
+SYNC_SETTLE_SECONDS = 5
 
 @security_bp.route('/verify-qr', methods=['POST'])
 def verify_qr():
@@ -53,6 +63,8 @@ def verify_qr():
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -74,3 +86,108 @@ def verify_face():
             return jsonify({"message": "Face verification failed"}), 403
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+def _is_valid_pass(row, now):
+    return (row['status'] == 'Approved' and row['qr_code'] and
+            row['to_time'] is not None and row['to_time'] >= now)
+
+@security_bp.route('/snapshot', methods=['GET'])
+def get_snapshot():
+    """Binary snapshot of currently valid passes for offline scanners"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            ensure_events_table(cursor)
+            cursor.execute("""
+                SELECT COALESCE(MAX(seq), 0) AS seq FROM pass_events
+                WHERE created_at <= NOW() - INTERVAL %s SECOND
+            """, (SYNC_SETTLE_SECONDS,))
+            seq = cursor.fetchone()['seq']
+            
+            cursor.execute("SELECT NOW() AS now")
+            now = cursor.fetchone()['now']
+            
+            cursor.execute("""
+                SELECT id, qr_code, from_time, to_time
+                FROM gate_pass_requests
+                WHERE status = 'Approved' AND qr_code IS NOT NULL AND to_time >= %s
+            """, (now,))
+            
+            sync_time = epoch(now)
+            data = encode_snapshot(seq, sync_time, cursor.fetchall())
+            return Response(data, mimetype='application/octet-stream',
+                            headers={'X-Pass-Seq': str(seq), 'X-Pass-Sync-Time': str(sync_time)}), 200
+        finally:
+            cursor.close()
+            close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@security_bp.route('/deltas', methods=['GET'])
+def get_deltas():
+    """Binary pass changes (approvals, rejections, expiries) since a sync cursor"""
+    try:
+        since = request.args.get('since', type=int)
+        since_time = request.args.get('since_time', type=int)
+        
+        if since is None or since < 0:
+            return jsonify({"error": "Missing or invalid 'since'"}), 400
+        if since_time is None or since_time < 0:
+            return jsonify({"error": "Missing or invalid 'since_time'"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            ensure_events_table(cursor)
+            
+            cursor.execute("SELECT NOW() AS now")
+            now = cursor.fetchone()['now']
+            
+            cursor.execute("""
+                SELECT COALESCE(MAX(seq), %s) AS upto FROM pass_events
+                WHERE seq > %s AND created_at <= NOW() - INTERVAL %s SECOND
+            """, (since, since, SYNC_SETTLE_SECONDS))
+            upto = cursor.fetchone()['upto']
+            
+            cursor.execute("""
+                SELECT DISTINCT request_id FROM pass_events
+                WHERE seq > %s AND seq <= %s
+            """, (since, upto))
+            changed_ids = {r['request_id'] for r in cursor.fetchall()}
+            
+            rows = []
+            if changed_ids:
+                placeholders = ', '.join(['%s'] * len(changed_ids))
+                cursor.execute(f"""
+                    SELECT id, qr_code, from_time, to_time, status
+                    FROM gate_pass_requests
+                    WHERE id IN ({placeholders})
+                """, list(changed_ids))
+                rows = cursor.fetchall()
+            
+            upserts = [r for r in rows if _is_valid_pass(r, now)]
+            removals = changed_ids - {r['id'] for r in upserts}
+            
+            # Passes valid at the last sync (to_time >= since_time) that have ended since
+            cursor.execute("""
+                SELECT id FROM gate_pass_requests
+                WHERE status = 'Approved' AND to_time >= %s AND to_time < %s
+            """, (datetime.fromtimestamp(since_time), now))
+            removals.update(r['id'] for r in cursor.fetchall())
+            
+            sync_time = epoch(now)
+            data = encode_deltas(since, upto, since_time, sync_time, upserts, sorted(removals))
+            return Response(data, mimetype='application/octet-stream',
+                            headers={'X-Pass-Seq': str(upto), 'X-Pass-Sync-Time': str(sync_time)}), 200
+        finally:
+            cursor.close()
+            close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from backend.config import get_db_connection, close_db_connection
+from backend.config import get_db_connection, close_db_connection, ShardKeyError
+from backend.profiling import install_profiling
+from backend.admission import install_admission_control, PRIORITY_NORMAL
 from datetime import datetime
 import pymysql
 
 student_bp = Blueprint('student', __name__)
+install_profiling(student_bp)
+install_admission_control(student_bp, priority=PRIORITY_NORMAL)
 
 @student_bp.route('/<int:student_id>/passes', methods=['GET'])
 def get_passes(student_id):
@@ -25,5 +29,7 @@ def get_passes(student_id):
         finally:
             cursor.close()
             close_db_connection(conn)
+    except ShardKeyError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,44 @@
+"""
+Pass archival maintenance command
+Moves expired passes out of the hot tables into compressed monthly archive files.
+Run it periodically (e.g. nightly from cron).
+"""
+import argparse
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from backend.config import get_db_connection, close_db_connection, ARCHIVE_DIR, ARCHIVE_HORIZON_DAYS, DB_SHARDS
+from backend.db.archive import archive_passes, archive_dir_for
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive expired gate passes")
+    parser.add_argument('--horizon-days', type=int, default=ARCHIVE_HORIZON_DAYS,
+                        help="archive passes that ended more than this many days ago")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true',
+                        help="only report how many passes would be archived")
+    args = parser.parse_args()
+    
+    cutoff = datetime.now() - timedelta(days=args.horizon_days)
+    
+    for shard in DB_SHARDS:
+        archive_dir = archive_dir_for(shard, args.archive_dir)
+        conn = get_db_connection(shard)
+        
+        try:
+            count = archive_passes(conn, cutoff, archive_dir, args.batch_size, args.dry_run)
+            if args.dry_run:
+                print(f"[{shard}] {count} passes ended before {cutoff:%Y-%m-%d %H:%M} and would be archived")
+            else:
+                print(f"\n✓ [{shard}] Archived {count} passes into {archive_dir}")
+        except Exception as e:
+            print(f"Error archiving passes on shard '{shard}': {e}")
+            sys.exit(1)
+        finally:
+            close_db_connection(conn)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Face embedding accuracy vs memory benchmark
+Builds a synthetic gallery (one enrolled vector per identity, queries are
+noisy captures of the same identities) and compares exact float32 search with
+float16 storage, int8 coarse-only search and int8 search re-ranked on the
+stored float16 blobs (looked up per query, as from the database; not resident).
+Runs over several noise levels: at low noise every variant finds the right
+identity, and the differences show up as captures approach the gallery's
+nearest-impostor similarity.
+"""
+import argparse
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import numpy as np
+from backend.embedding_codec import FaceGallery, encode_embedding, decode_embedding
+
+def make_gallery(n, dim, seed):
+    rng = np.random.default_rng(seed)
+    gallery = rng.standard_normal((n, dim)).astype(np.float32)
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+    return gallery
+
+def make_probes(gallery, queries, noise, seed):
+    rng = np.random.default_rng(seed + 1)
+    n, dim = gallery.shape
+    truth = rng.integers(0, n, size=queries)
+    probes = gallery[truth] + noise * rng.standard_normal((queries, dim)).astype(np.float32) / np.sqrt(dim)
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+    return probes, truth
+
+def timed(fn, probes):
+    start = time.perf_counter()
+    hits = [fn(p) for p in probes]
+    return np.array(hits), (time.perf_counter() - start) / len(probes) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized face galleries")
+    parser.add_argument('--gallery', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=128)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, nargs='+', default=[1.5, 2.0, 2.5, 3.0],
+                        help="capture noise levels relative to the unit embedding")
+    parser.add_argument('--candidates', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    gallery = make_gallery(args.gallery, args.dim, args.seed)
+    ids = np.arange(args.gallery)
+
+    blobs = [encode_embedding(v, 'float16') for v in gallery]
+    f16 = np.stack([decode_embedding(b) for b in blobs]).astype(np.float16)
+    quantized = FaceGallery.from_blobs(zip(ids, blobs))
+    reranked = FaceGallery(quantized.ids, quantized.codes, quantized.scales,
+                           load_blobs=lambda student_ids: {i: blobs[i] for i in student_ids})
+
+    variants = [
+        ('float32 exact', gallery.nbytes + ids.nbytes,
+         lambda p: int(np.argmax(gallery @ p))),
+        ('float16', f16.nbytes + ids.nbytes,
+         lambda p: int(np.argmax(f16.astype(np.float32) @ p))),
+        ('int8 coarse only', quantized.nbytes,
+         lambda p: int(np.argmax(quantized.coarse_scores(p)))),
+        ('int8 + re-rank', quantized.nbytes,
+         lambda p: reranked.match(p, top_k=1, candidates=args.candidates)[0][0]),
+    ]
+
+    print(f"gallery={args.gallery} dim={args.dim} queries={args.queries}")
+
+    for noise in args.noise:
+        probes, truth = make_probes(gallery, args.queries, noise, args.seed)
+        baseline, _ = timed(variants[0][2], probes)
+        print(f"\nnoise={noise}")
+        print(f"{'variant':<18} {'memory (MB)':>12} {'recall@1':>9} {'agree w/ f32':>13} {'ms/query':>9}")
+
+        for name, nbytes, fn in variants:
+            hits, ms = timed(fn, probes)
+            recall = np.mean(hits == truth)
+            agree = np.mean(hits == baseline)
+            print(f"{name:<18} {nbytes / 1e6:>12.2f} {recall:>9.3f} {agree:>13.3f} {ms:>9.2f}")
+
+if __name__ == '__main__':
+    main()
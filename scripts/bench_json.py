@@ -0,0 +1,97 @@
+"""
+JSON serialization micro-benchmark
+Compares the old list_passes response path (per-row strftime + dict rebuild +
+stdlib json, as Flask's default provider does it) with the new one (rows
+projected by MySQL, encoded by backend.json_provider) at 1k, 10k and 100k rows.
+
+The new path's DATE_FORMAT work runs in MySQL, which this script cannot time.
+So it reports two figures. "encode" times only backend.json_provider on rows
+that are already projected. "+ projection" also includes building those rows in
+Python (strftime per row), an upper bound on the work moved into MySQL. Compare
+the old path against "+ projection" for the end-to-end saving.
+"""
+import argparse
+import json
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import timeit
+from datetime import datetime, timedelta
+from backend import json_provider
+
+def make_raw_rows(n):
+    """Rows as the old SELECT returned them"""
+    start = datetime(2024, 1, 1, 8, 0)
+    return [{
+        'id': i,
+        'reason': f"Medical appointment {i}",
+        'from_time': start + timedelta(minutes=i),
+        'to_time': start + timedelta(minutes=i + 90),
+        'status': 'Approved' if i % 3 else None,
+        'faculty_name': 'Dr. Faculty' if i % 5 else None,
+        'student_id': i % 2000,
+    } for i in range(n)]
+
+def project(raw_rows):
+    """Rows as the PASS_LIST_PROJECTION SELECT returns them"""
+    return [{
+        'id': r['id'],
+        'date': r['from_time'].strftime('%Y-%m-%d'),
+        'time': r['from_time'].strftime('%H:%M'),
+        'reason': r['reason'],
+        'status': r['status'] or 'Pending',
+        'faculty': r['faculty_name'] or 'Unassigned',
+        'studentId': r['student_id'],
+    } for r in raw_rows]
+
+def old_path(rows):
+    result = []
+    for r in rows:
+        from_time = r['from_time'].strftime('%Y-%m-%d %H:%M') if r.get('from_time') else ''
+        to_time = r['to_time'].strftime('%Y-%m-%d %H:%M') if r.get('to_time') else ''
+        result.append({
+            'id': r['id'],
+            'date': from_time[:10] if from_time else '',
+            'time': from_time[11:16] if from_time else '',
+            'reason': r['reason'],
+            'status': r['status'] or 'Pending',
+            'faculty': r.get('faculty_name') or 'Unassigned',
+            'studentId': r.get('student_id'),
+        })
+    return json.dumps(result, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def new_path(rows):
+    return json_provider.dumps_bytes(rows)
+
+def new_path_with_projection(raw_rows):
+    return json_provider.dumps_bytes(project(raw_rows))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pass list serialization")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    encoder = 'orjson' if json_provider.orjson is not None else 'stdlib json'
+    print(f"New path encoder: {encoder}\n")
+    print(f"{'rows':>8} {'old (ms)':>10} {'encode (ms)':>12} {'speedup':>8} "
+          f"{'+ projection (ms)':>18} {'speedup':>8}")
+
+    for n in args.sizes:
+        raw = make_raw_rows(n)
+        projected = project(raw)
+        number = max(1, 10000 // n)
+
+        def best(fn, rows):
+            return min(timeit.repeat(lambda: fn(rows), number=number, repeat=args.repeat)) / number
+
+        old = best(old_path, raw)
+        new = best(new_path, projected)
+        full = best(new_path_with_projection, raw)
+
+        print(f"{n:>8} {old * 1000:>10.2f} {new * 1000:>12.2f} {old / new:>7.1f}x "
+              f"{full * 1000:>18.2f} {old / full:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
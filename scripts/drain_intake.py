@@ -0,0 +1,26 @@
+"""
+Pass intake drainer
+Writes passes accepted by POST /passes/queued to MySQL in steady batches.
+Run one (or a few) alongside the web workers; extra drainers are safe.
+"""
+import signal
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from backend.config import INTAKE_BATCH_SIZE, INTAKE_DRAIN_INTERVAL
+from backend.intake_queue import run_drainer
+
+def main():
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    
+    print(f"Draining intake queue: up to {INTAKE_BATCH_SIZE} passes per shard "
+          f"every {INTAKE_DRAIN_INTERVAL}s")
+    run_drainer(stop_event)
+    print("✓ Drainer stopped")
+
+if __name__ == '__main__':
+    main()
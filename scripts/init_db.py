@@ -6,15 +6,16 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.config import get_db_connection, close_db_connection
+from backend.config import get_db_connection, close_db_connection, DB_SHARDS
+from backend.db.archive import ensure_window_index
 
-def init_database():
+def init_database(shard=None):
     """Create all required tables"""
-    conn = get_db_connection()
+    conn = get_db_connection(shard)
     cursor = conn.cursor()
     
     try:
-        print("Creating tables...")
+        print(f"Creating tables on shard '{shard}'..." if shard else "Creating tables...")
         
         # Users table
         cursor.execute("""
@@ -85,16 +86,28 @@ def init_database():
                 from_time DATETIME NOT NULL,
                 to_time DATETIME NOT NULL,
                 status VARCHAR(32) DEFAULT 'Pending',
-                qr_code VARCHAR(255),
+                qr_code VARCHAR(255) UNIQUE,
                 rejection_reason TEXT,
                 approved_at DATETIME,
                 rejected_at DATETIME,
                 approved_by INT,
+                intake_id VARCHAR(36) UNIQUE,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_gate_pass_window (to_time, from_time),
                 FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
                 FOREIGN KEY (faculty_id) REFERENCES faculty(id) ON DELETE SET NULL
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
         """)
+        
+        # Tables created before qr_code was unique need the index added
+        cursor.execute("""
+            SELECT COUNT(*) AS n FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'gate_pass_requests'
+              AND COLUMN_NAME = 'qr_code' AND SEQ_IN_INDEX = 1 AND NON_UNIQUE = 0
+        """)
+        if not cursor.fetchone()['n']:
+            cursor.execute("ALTER TABLE gate_pass_requests ADD UNIQUE INDEX uq_gate_pass_qr_code (qr_code)")
+        ensure_window_index(cursor)
         print("✓ Gate pass requests table created")
         
         # QR codes table
@@ -111,6 +124,18 @@ def init_database():
         """)
         print("✓ QR codes table created")
         
+        # Pass events table (change log for scanner delta sync)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pass_events (
+                seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+                request_id INT NOT NULL,
+                event VARCHAR(16) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_pass_events_request (request_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """)
+        print("✓ Pass events table created")
+        
         # Attendance table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS attendance (
@@ -140,4 +165,5 @@ def init_database():
         close_db_connection(conn)
 
 if __name__ == '__main__':
-    init_database()
+    for shard in DB_SHARDS:
+        init_database(shard)
@@ -0,0 +1,79 @@
+"""
+Face embedding migration script
+Re-encodes students.face_embedding blobs into the compact versioned format
+(see backend/embedding_codec.py). Blobs already in the current format are skipped.
+"""
+import argparse
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.config import get_db_connection, close_db_connection, DB_SHARDS
+from backend.embedding_codec import decode_embedding, encode_embedding, blob_version, FORMAT_VERSION
+
+def migrate_shard(shard, dtype, batch_size, dry_run):
+    """Re-encode all legacy blobs on one shard; returns (migrated, failed)"""
+    conn = get_db_connection(shard)
+    cursor = conn.cursor()
+    migrated = failed = 0
+    last_id = 0
+    
+    try:
+        while True:
+            cursor.execute("""
+                SELECT id, face_embedding FROM students
+                WHERE id > %s AND face_embedding IS NOT NULL
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            
+            updates = []
+            for row in rows:
+                if blob_version(row['face_embedding']) == FORMAT_VERSION:
+                    continue
+                try:
+                    vec = decode_embedding(row['face_embedding'])
+                    updates.append((encode_embedding(vec, dtype), row['id']))
+                except ValueError as e:
+                    print(f"[{shard}] Skipping student {row['id']}: {e}")
+                    failed += 1
+            
+            if updates and not dry_run:
+                cursor.executemany(
+                    "UPDATE students SET face_embedding = %s WHERE id = %s", updates
+                )
+                conn.commit()
+            migrated += len(updates)
+        
+        return migrated, failed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        close_db_connection(conn)
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode stored face embeddings")
+    parser.add_argument('--dtype', choices=['int8', 'float16'], default='float16')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true',
+                        help="only report how many blobs would be re-encoded")
+    args = parser.parse_args()
+    
+    for shard in DB_SHARDS:
+        try:
+            migrated, failed = migrate_shard(shard, args.dtype, args.batch_size, args.dry_run)
+            verb = "would be re-encoded" if args.dry_run else "re-encoded"
+            print(f"✓ [{shard}] {migrated} embeddings {verb} as {args.dtype}, {failed} unreadable")
+        except Exception as e:
+            print(f"Error migrating embeddings on shard '{shard}': {e}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()